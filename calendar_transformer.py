@@ -1,18 +1,148 @@
-import toml
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+    import toml
 import caldav
+from collections import namedtuple
 from caldav.elements import dav, cdav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib.error import ConsistencyError
 import datetime
+import functools
+import hashlib
+import importlib
+import inspect
 from dateutil.tz import gettz
-import vobject
 import logging
-import uuid
+import re
+import shelve
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 
 CONFIG_PATH = "config.toml"
+# Destination calendar index kept between runs
+STATE_PATH = ".calendar_transformer_state"
+# Bump when the cached event fields change
+STATE_VERSION = 4
+# Source calendars are fetched this far past the search window, so that
+# later runs can reuse the parsed events while the calendar is unchanged
+SOURCE_CACHE_MARGIN = datetime.timedelta(days=7)
+# Upper bound on concurrent CalDAV requests
+MAX_WORKERS = 16
+# Retries for failed connections, with a short exponential backoff
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.2
+# Bound once, so per-event code skips the datetime module attribute chain
+UTC = datetime.timezone.utc
+# Summary prefix marking an event as declined; a single code point
+DECLINED_PREFIX = "❌"
 
 logging.basicConfig(level=logging.INFO)
 
 
+def load_config(path):
+    # Prefer the stdlib parser; fall back to the toml package on older Pythons
+    if tomllib is not None:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    return toml.load(path)
+
+
+def configure_session(client):
+    # Size the HTTP connection pool to match the concurrent CalDAV requests,
+    # so worker threads reuse kept-alive connections instead of reconnecting,
+    # and retry dropped connections rather than failing the whole run
+    session = getattr(client, "session", None)
+    # caldav 2+ runs on niquests, older releases on requests; both take the
+    # same adapter, and their default pool of 10 is smaller than MAX_WORKERS
+    for module_name in ("niquests", "requests"):
+        try:
+            http = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        if isinstance(session, http.Session):
+            break
+    else:
+        return
+    adapter = http.adapters.HTTPAdapter(
+        pool_connections=MAX_WORKERS,
+        pool_maxsize=MAX_WORKERS,
+        max_retries=http.adapters.Retry(
+            total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+
+
+# Event body shared by every saved event; optional properties are
+# pre-rendered into optional_lines
+ICAL_TEMPLATE = (
+    "BEGIN:VCALENDAR\nVERSION:2.0\n"
+    "BEGIN:VEVENT\n"
+    "UID:{uid}\n"
+    "DTSTAMP:{dtstamp}\n"
+    "SUMMARY:{summary}\n"
+    "DTSTART{value_type}:{dtstart}\n"
+    "DTEND{value_type}:{dtend}\n"
+    "{optional_lines}"
+    "END:VEVENT\nEND:VCALENDAR"
+)
+
+
+# RFC 5545 TEXT escapes, applied in one str.translate pass
+ICAL_ESCAPES = str.maketrans({"\\": "\\\\", ";": "\\;", ",": "\\,", "\n": "\\n"})
+
+
+def content_uid(*fields):
+    # 128-bit hash of the given fields as plain hex, so an unchanged event is
+    # written with the same UID on every run
+    data = "|".join("" if f is None else str(f) for f in fields)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def format_ical_date(value):
+    # Integer formatting is cheaper than strftime, which goes through libc
+    return f"{value.year:04d}{value.month:02d}{value.day:02d}"
+
+
+def format_ical_utc(value):
+    # value must already be in UTC
+    return (
+        f"{value.year:04d}{value.month:02d}{value.day:02d}"
+        f"T{value.hour:02d}{value.minute:02d}{value.second:02d}Z"
+    )
+
+
+class GetCTag(ValuedBaseElement):
+    # CalendarServer collection tag; changes whenever the calendar changes
+    tag = "{http://calendarserver.org/ns/}getctag"
+
+
+def get_collection_tags(calendar):
+    # ctag and RFC 6578 sync token of a calendar, read in one PROPFIND;
+    # either is None if the server doesn't provide it
+    try:
+        props = calendar.get_properties([GetCTag(), dav.SyncToken()])
+    except Exception as ex:
+        logging.warning(f"Could not read ctag of '{calendar.name}': {ex}")
+        return None, None
+    return props.get(GetCTag.tag), props.get(dav.SyncToken.tag)
+
+
+def run_concurrently(func, items):
+    # Apply func to every item on a thread pool. Meant for independent CalDAV
+    # requests, so wall time follows the slowest requests rather than the sum.
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
 def ensure_list(val):
     if val is None:
         return []
@@ -21,6 +151,222 @@ def ensure_list(val):
     return list(val)
 
 
+def compile_substrings(substrings, match_all=False):
+    # Fold a substring list into one compiled regex so a single search checks
+    # every substring: any of them (alternation) or all of them (lookaheads).
+    # Returns a predicate, or None if there is nothing to match.
+    substrings = ensure_list(substrings)
+    if not substrings:
+        return None
+    escaped = [re.escape(s) for s in substrings]
+    if match_all:
+        return re.compile("".join(f"(?=.*?{s})" for s in escaped), re.DOTALL).match
+    return re.compile("|".join(escaped)).search
+
+
+def normalize_text(val):
+    # Substring checks in transformations ignore newlines and outer whitespace
+    return (val or "").replace("\n", " ").strip()
+
+
+# A filter set with its substring lists compiled once, up front
+CompiledFilter = namedtuple(
+    "CompiledFilter",
+    [
+        "calendar_name",
+        "not_calendar_name",
+        "name_contains",
+        "name_not_contains",
+        "location_contains",
+        "location_not_contains",
+        "transformation",
+    ],
+)
+
+# A transformation with its fixed overrides and its strip substrings compiled
+# into matchers over normalized text
+CompiledTransformation = namedtuple(
+    "CompiledTransformation",
+    [
+        "overrides",
+        "strip_name",
+        "check_name",
+        "strip_if_name_contains",
+        "strip_if_name_not_contains",
+        "strip_location",
+        "check_location",
+        "strip_if_location_contains",
+        "strip_if_location_not_contains",
+    ],
+)
+
+
+def compile_transformation(transformation):
+    t = transformation or {}
+    overrides = {}
+    for option, field in (
+        ("set_event_name", "summary"),
+        ("set_location", "location"),
+        ("set_rsvp_status", "rsvp"),
+    ):
+        if t.get(option) is not None:
+            overrides[field] = t[option]
+
+    def substrings(option, match_all=False):
+        # Normalize the config strings as well, in case they have unintended newlines
+        return compile_substrings(
+            [normalize_text(s) for s in ensure_list(t.get(option, []))], match_all
+        )
+
+    strip_name = t.get("strip_name", False)
+    strip_location = t.get("strip_location", False)
+    # Whether the conditional name/location rules apply at all
+    check_name = bool(
+        strip_name
+        or t.get("strip_if_event_name_contains")
+        or t.get("strip_if_event_name_not_contains")
+    )
+    check_location = bool(
+        strip_location
+        or t.get("strip_if_location_contains")
+        or t.get("strip_if_location_not_contains")
+    )
+    if not (overrides or check_name or check_location):
+        # Nothing to change; transform_event passes events through as is
+        return None
+    return CompiledTransformation(
+        overrides,
+        strip_name,
+        check_name,
+        substrings("strip_if_event_name_contains"),
+        # Stripping is skipped if any of these is missing, i.e. not all present
+        substrings("strip_if_event_name_not_contains", match_all=True),
+        strip_location,
+        check_location,
+        substrings("strip_if_location_contains"),
+        substrings("strip_if_location_not_contains"),
+    )
+
+
+def compile_filter(filter_obj):
+    f = filter_obj.get("filters", {})
+    # Intern calendar names so the repeated name comparisons can take
+    # CPython's identity fast path
+    cal_name, not_cal_name = f.get("calendar_name"), f.get("not_calendar_name")
+    return CompiledFilter(
+        sys.intern(cal_name) if isinstance(cal_name, str) else cal_name,
+        sys.intern(not_cal_name) if isinstance(not_cal_name, str) else not_cal_name,
+        compile_substrings(f.get("event_name_contains"), match_all=True),
+        compile_substrings(f.get("event_name_not_contains")),
+        compile_substrings(f.get("location_contains"), match_all=True),
+        compile_substrings(f.get("location_not_contains")),
+        compile_transformation(filter_obj.get("transformations", {})),
+    )
+
+
+def is_declined(summary, rsvp):
+    # Declined if RSVP is DECLINED or summary starts with ❌. The prefix is one
+    # character, so a one-character slice compare replaces startswith().
+    return (rsvp or "").upper() == "DECLINED" or (summary or "")[:1] == DECLINED_PREFIX
+
+
+def to_utc(value, local_tz):
+    # Normalize a datetime to UTC, treating naive values as local_tz.
+    # All-day dates are returned unchanged.
+    if not isinstance(value, datetime.datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=local_tz)
+    return value.astimezone(UTC)
+
+
+def as_utc_datetime(value):
+    # Aware UTC datetime for comparisons; all-day dates become midnight UTC
+    if isinstance(value, datetime.datetime):
+        # Already-UTC values (most of them, after to_utc) need no conversion
+        return value if value.tzinfo is UTC else value.astimezone(UTC)
+    return datetime.datetime.combine(value, datetime.time.min, tzinfo=UTC)
+
+
+def implied_end(dtstart, dtend):
+    # DTEND, or what RFC 4791 9.9 takes it to be when missing: an all-day
+    # event lasts one day, a timed one is an instant
+    if dtend or isinstance(dtstart, datetime.datetime):
+        return dtend or dtstart
+    return dtstart + datetime.timedelta(days=1)
+
+
+def in_window(event, window_start, window_end):
+    # Whether a parsed event overlaps [window_start, window_end)
+    start = as_utc_datetime(event["dtstart"])
+    end = as_utc_datetime(implied_end(event["dtstart"], event["dtend"]))
+    if end == start:
+        return window_start <= start < window_end
+    return start < window_end and end > window_start
+
+
+def vevent_value(vevent, name, default=None):
+    # Value of a VEVENT property, or default if the event doesn't have it.
+    # One lookup in the common case, unlike a getattr guard plus re-access.
+    try:
+        return getattr(vevent, name).value
+    except AttributeError:
+        return default
+
+
+def vevent_end(vevent):
+    # DTEND, or DTSTART + DURATION; None if the event has neither
+    dtend = vevent_value(vevent, "dtend")
+    duration = vevent_value(vevent, "duration")
+    if duration and not dtend:
+        dtend = vevent.dtstart.value + duration
+    return dtend
+
+
+def iter_occurrences(vcal, window_start, window_end, local_tz):
+    # Expand the events of one calendar object into (vevent, dtstart, dtend)
+    # occurrences overlapping the window. Recurring masters are expanded with
+    # their rruleset (RRULE, RDATE, EXDATE); instances overridden by a
+    # RECURRENCE-ID component are yielded from that component instead.
+    vevents = getattr(vcal, "vevent_list", [])
+    overridden = set()
+    for vevent in vevents:
+        if hasattr(vevent, "recurrence_id"):
+            overridden.add(to_utc(vevent.recurrence_id.value, local_tz))
+
+    for vevent in vevents:
+        dtstart = vevent.dtstart.value
+        dtend = vevent_end(vevent)
+
+        if hasattr(vevent, "recurrence_id"):
+            # Overrides can be moved out of the window the server matched on
+            start_utc = as_utc_datetime(to_utc(dtstart, local_tz))
+            end_utc = as_utc_datetime(to_utc(implied_end(dtstart, dtend), local_tz))
+            if start_utc < window_end and end_utc > window_start:
+                yield vevent, dtstart, dtend
+            continue
+        if not (hasattr(vevent, "rrule") or hasattr(vevent, "rdate")):
+            yield vevent, dtstart, dtend
+            continue
+
+        # Occurrences come back naive for all-day and floating events, so the
+        # window has to be given in local wall time for those
+        all_day = not isinstance(dtstart, datetime.datetime)
+        lo, hi = window_start, window_end
+        if all_day or dtstart.tzinfo is None:
+            lo = lo.astimezone(local_tz).replace(tzinfo=None)
+            hi = hi.astimezone(local_tz).replace(tzinfo=None)
+        length = implied_end(dtstart, dtend) - dtstart
+
+        # Exclusive bounds: the occurrence must end after lo and start before hi
+        for occurrence in vevent.getrruleset(addRDate=True).between(lo - length, hi):
+            if all_day:
+                occurrence = occurrence.date()
+            if to_utc(occurrence, local_tz) in overridden:
+                continue
+            yield vevent, occurrence, dtend and occurrence + length
+
+
 class EventTransformer:
     def __init__(self, config):
         self.config = config
@@ -28,16 +374,33 @@ class EventTransformer:
         self.dest_calendar = config.get("dest_calendar")
         self.future_scan_days = config.get("future_scan_days", None)
         self.past_keep_days = config.get("past_keep_days", None)
+        self._dtstamp = None
+        # Naive datetimes are read as system local time, resolved once
+        self._local_tz = datetime.datetime.now().astimezone().tzinfo
+        if isinstance(self.dest_calendar, str):
+            self.dest_calendar = sys.intern(self.dest_calendar)
+        # Filter sets without a source calendar, or reading from the
+        # destination, can never match anything; drop them up front
+        self.filter_sets = [
+            filter_obj
+            for filter_obj in self.filter_sets
+            if filter_obj.get("filters", {}).get("calendar_name")
+            and filter_obj["filters"]["calendar_name"] != self.dest_calendar
+        ]
+
+        # Compile the filter sets once and group them by source calendar, in
+        # config order, so each source event is only checked against its own
+        # calendar's filters
+        self.filters_by_cal = {}
+        for filter_obj in self.filter_sets:
+            compiled_filter = compile_filter(filter_obj)
+            self.filters_by_cal.setdefault(compiled_filter.calendar_name, []).append(
+                compiled_filter
+            )
 
     def should_delete_event(self, event):
-        # Delete if RSVP is DECLINED or summary starts with ❌
-        rsvp = event.get("rsvp", "")
-        summary = event.get("summary", "")
-        if rsvp and rsvp.upper() == "DECLINED":
-            return True
-        if summary.startswith("❌"):
-            return True
-        return False
+        # Every event dict gets the flag when it is parsed or transformed
+        return event["declined"]
 
     def event_key(self, event):
         # Create a unique key combining UID and start date to handle recurring events
@@ -45,143 +408,318 @@ class EventTransformer:
         dtstart = event.get('dtstart')
         if isinstance(dtstart, datetime.datetime):
             # Convert to UTC for consistent comparison
-            dtstart = dtstart.astimezone(datetime.timezone.utc)
+            if dtstart.tzinfo is not UTC:
+                dtstart = dtstart.astimezone(UTC)
             date_str = dtstart.strftime('%Y%m%d%H%M%S')
         else:
             # All-day event
             date_str = dtstart.strftime('%Y%m%d')
         return f"{uid}_{date_str}"
 
-    def match_event(self, event, filter_obj):
+    def match_event(self, event, compiled_filter):
         # Filtering logic: calendar name, event name, location substring, negation
         cal_name = event["calendar"]
         summary = event["summary"]
-        location = event.get("location", "")
-        f = filter_obj.get("filters", {})
-
-        def match_substring(val, substrings, negate=False):
-            if not substrings:
-                return True
-            for s in substrings:
-                if (s in val) == negate:
-                    return False
-            return True
-
-        if f.get("calendar_name") and cal_name != f["calendar_name"]:
+        location = event.get("location") or ""
+        f = compiled_filter
+
+        if f.calendar_name and cal_name != f.calendar_name:
             return False
-        if f.get("not_calendar_name") and cal_name == f["not_calendar_name"]:
+        if f.not_calendar_name and cal_name == f.not_calendar_name:
             return False
-        if not match_substring(
-            summary, ensure_list(f.get("event_name_contains", [])), False
-        ):
+        if f.name_contains and not f.name_contains(summary):
             return False
-        if not match_substring(
-            summary, ensure_list(f.get("event_name_not_contains", [])), True
-        ):
+        if f.name_not_contains and f.name_not_contains(summary):
             return False
-        if not match_substring(
-            location, ensure_list(f.get("location_contains", [])), False
-        ):
+        if f.location_contains and not f.location_contains(location):
             return False
-        if not match_substring(
-            location, ensure_list(f.get("location_not_contains", [])), True
-        ):
+        if f.location_not_contains and f.location_not_contains(location):
             return False
         return True
 
     def transform_event(self, event, transformation):
-        # Apply transformation rules from config only
+        # Apply a compiled transformation. The source event is left untouched:
+        # fixed overrides are merged into a new dict in one step. Without a
+        # transformation the event is shared as is, it is never modified.
         t = transformation
-
-        def match_substring(val, substrings, negate=False):
-            if not substrings:
-                return False
-            # Normalize the input string by removing all newlines
-            val = val or ""
-            normalized_val = val.replace("\n", " ").strip()
-            for s in substrings:
-                # Normalize the config string as well, in case it has unintended newlines
-                normalized_s = s.replace("\n", " ").strip()
-                if (normalized_s in normalized_val) != negate:
-                    return True
-            return False
-
-        if t.get("set_event_name") is not None:
-            event["summary"] = t["set_event_name"]
-        if t.get("set_location") is not None:
-            event["location"] = t["set_location"]
-        if t.get("set_rsvp_status") is not None:
-            event["rsvp"] = t["set_rsvp_status"]
+        if t is None:
+            return event
+        event = {**event, **t.overrides}
 
         # Conditional stripping for event name
-        strip_name = t.get("strip_name", False)
-        do_strip_name = strip_name
-        if (
-            strip_name
-            or t.get("strip_if_event_name_contains")
-            or t.get("strip_if_event_name_not_contains")
-        ):
+        do_strip_name = t.strip_name
+        if t.check_name:
+            # Normalize the input string by removing all newlines
+            summary = normalize_text(event.get("summary", ""))
             # If substring found in event name, strip
-            if match_substring(
-                event.get("summary", ""),
-                ensure_list(t.get("strip_if_event_name_contains", [])),
-                False,
-            ):
+            if t.strip_if_name_contains and t.strip_if_name_contains(summary):
                 do_strip_name = True
             # If substring found in event name _not_, skip stripping
-            if match_substring(
-                event.get("summary", ""),
-                ensure_list(t.get("strip_if_event_name_not_contains", [])),
-                True,
+            if t.strip_if_name_not_contains and not t.strip_if_name_not_contains(
+                summary
             ):
                 do_strip_name = False
         if do_strip_name:
             event["summary"] = ""
 
         # Conditional stripping for location
-        strip_location = t.get("strip_location", False)
-        do_strip_location = strip_location
-        if (
-            strip_location
-            or t.get("strip_if_location_contains")
-            or t.get("strip_if_location_not_contains")
-        ):
+        do_strip_location = t.strip_location
+        if t.check_location:
+            location = normalize_text(event.get("location", ""))
             # If substring found in location, strip
-            if match_substring(
-                event.get("location", ""),
-                ensure_list(t.get("strip_if_location_contains", [])),
-                False,
-            ):
+            if t.strip_if_location_contains and t.strip_if_location_contains(location):
                 do_strip_location = True
             # If substring found in location _not_, skip stripping
-            if match_substring(
-                event.get("location", ""),
-                ensure_list(t.get("strip_if_location_not_contains", [])),
-                False,
+            if t.strip_if_location_not_contains and t.strip_if_location_not_contains(
+                location
             ):
                 do_strip_location = False
         if do_strip_location:
             event["location"] = ""
+        event["declined"] = is_declined(event.get("summary"), event.get("rsvp"))
         return event
 
-    def sanitize_text(self, text):
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def sanitize_text(text):
+        # Cached, since the same locations and titles recur across many events
         if not text:
             return ""
-        # Escape backslashes, semicolons, and commas
-        text = text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
-        # Replace newlines with escaped n
-        text = text.replace("\n", "\\n")
-        # You may need to fold long lines if they exceed 75 characters, but for newlines, the above is the key fix
-        return text
+        # Escape backslashes, semicolons, commas and newlines in a single pass
+        # You may need to fold long lines if they exceed 75 characters, but for newlines, the escape is the key fix
+        return text.translate(ICAL_ESCAPES)
+
+    def iter_source_events(self, cal_name, raw_events, window_start, window_end):
+        # Parse fetched calendar objects into event dicts, one per occurrence
+        # in the window; recurring events arrive unexpanded and are expanded
+        # here. fetch_source_events collects the result into the source cache,
+        # so every parsed event of a calendar is held in memory.
+        local_tz = self._local_tz
+        for e in raw_events:
+            # A malformed object is skipped as a whole, rather than failing the
+            # fetch or leaving part of a series behind
+            try:
+                # caldav parses the object data into vobject_instance on access
+                vcal = e.vobject_instance
+                events = [
+                    self.source_event(cal_name, vevent, dtstart, dtend, local_tz)
+                    for vevent, dtstart, dtend in iter_occurrences(
+                        vcal, window_start, window_end, local_tz
+                    )
+                ]
+            except Exception as ex:
+                logging.error(f"Failed to parse event {e.url}: {ex}")
+                continue
+            yield from events
+
+    def source_event(self, cal_name, vevent, dtstart, dtend, local_tz):
+        # Create a dictionary for one occurrence; original_uid is set
+        # here so transformed copies carry it without extra work
+        uid = vevent_value(vevent, "uid")
+        event = {
+            "calendar": cal_name,
+            "uid": uid,
+            "original_uid": uid,
+            "summary": vevent_value(vevent, "summary", ""),
+            "dtstart": dtstart,
+            "dtend": dtend,
+            "location": vevent_value(vevent, "location"),
+            "rsvp": vevent_value(vevent, "partstat", ""),
+        }
+
+        event["declined"] = is_declined(event["summary"], event["rsvp"])
+
+        # Handle naive datetimes and convert to UTC
+        event["dtstart"] = to_utc(event["dtstart"], local_tz)
+        if event["dtend"]:
+            event["dtend"] = to_utc(event["dtend"], local_tz)
+
+        return event
+
+    def parse_dest_event(self, e):
+        # Reduce a destination calendar object to the fields the deletion and
+        # duplicate checks need; the result is also what gets cached on disk.
+        # Times are stored in UTC: vobject's TZID timezones can't be pickled.
+        vevent = e.vobject_instance.vevent
+        dest_event = {
+            "url": str(e.url),
+            "uid": vevent.uid.value,
+            "original_uid": vevent_value(vevent, "x_original_uid"),
+            "summary": vevent.summary.value,
+            "dtstart": to_utc(vevent.dtstart.value, self._local_tz),
+            "dtend": to_utc(vevent_value(vevent, "dtend"), self._local_tz),
+        }
+        return self.index_dest_event(dest_event)
+
+    def index_dest_event(self, dest_event):
+        # Derived fields for the prune, deletion and duplicate checks, computed
+        # once per event and cached with it between runs
+        dest_event["key"] = self.event_key(dest_event)
+        dest_event["start_utc"] = as_utc_datetime(dest_event["dtstart"])
+        dest_event["end_utc"] = dest_event["dtend"] and as_utc_datetime(
+            dest_event["dtend"]
+        )
+        dest_event["declined"] = is_declined(dest_event["summary"], None)
+        return dest_event
+
+    def load_dest_state(self):
+        # Cached destination index from the last run, if there is one
+        try:
+            with shelve.open(STATE_PATH, "r") as state:
+                cached = state.get("dest")
+        except Exception:
+            return None
+        if (
+            not cached
+            or cached.get("version") != STATE_VERSION
+            or cached["calendar"] != self.dest_calendar
+        ):
+            return None
+        return cached
+
+    def load_source_state(self):
+        # Parsed source events from the last run, by calendar name
+        try:
+            with shelve.open(STATE_PATH, "r") as state:
+                cached = state.get("sources")
+        except Exception:
+            return {}
+        if not cached or cached.get("version") != STATE_VERSION:
+            return {}
+        return cached["calendars"]
+
+    def save_source_state(self, sources):
+        try:
+            with shelve.open(STATE_PATH) as state:
+                state["sources"] = {"version": STATE_VERSION, "calendars": sources}
+        except Exception as ex:
+            logging.warning(f"Could not save state to '{STATE_PATH}': {ex}")
+
+    def fetch_source_events(self, calendar, cal_name, cached, window_start, window_end):
+        # Parsed events of one source calendar overlapping the search window.
+        # The last run's events are reused while the calendar's ctag is
+        # unchanged and they cover the window; otherwise the calendar is
+        # fetched again, with some margin. Declined events are dropped as
+        # they are parsed, before they are cached, filtered or transformed.
+        # Returns (cache entry, events).
+        ctag, _ = get_collection_tags(calendar)
+        if (
+            cached is None
+            or ctag is None
+            or cached["ctag"] != ctag
+            or cached["start"] > window_start
+            or cached["end"] < window_end
+        ):
+            fetch_end = window_end + SOURCE_CACHE_MARGIN
+            raw_events = calendar.search(
+                start=window_start,
+                end=fetch_end,
+                event=True,
+                # Recurring events are expanded client-side, so each
+                # series comes over the wire and is parsed only once
+                expand=False,
+            )
+            cached = {
+                "ctag": ctag,
+                "start": window_start,
+                "end": fetch_end,
+                "events": [
+                    e
+                    for e in self.iter_source_events(
+                        cal_name, raw_events, window_start, fetch_end
+                    )
+                    if not self.should_delete_event(e)
+                ],
+            }
+        else:
+            logging.info(
+                f"Source calendar '{cal_name}' unchanged, using cached events."
+            )
+        events = [e for e in cached["events"] if in_window(e, window_start, window_end)]
+        return cached, events
+
+    def sync_dest_state(self, dest_cal, cached):
+        # Bring a cached index up to date with the changes made since it was
+        # saved, using a sync-collection report. Returns None if that isn't
+        # possible, in which case the destination is fetched in full.
+        if not cached.get("sync_token"):
+            return None
+        # caldav 2+ falls back to listing the whole calendar when the report
+        # fails (e.g. an expired token); the full fetch done by the caller is
+        # bounded to the search window, so make it raise instead
+        try:
+            objects_by_sync_token = (
+                getattr(dest_cal, "get_objects_by_sync_token", None)
+                or dest_cal.objects_by_sync_token
+            )
+            kwargs = {}
+            params = inspect.signature(objects_by_sync_token).parameters
+            if "disable_fallback" in params:
+                kwargs["disable_fallback"] = True
+            changes = objects_by_sync_token(
+                sync_token=cached["sync_token"], load_objects=True, **kwargs
+            )
+        except Exception as ex:
+            logging.warning(f"Incremental sync of '{self.dest_calendar}' failed: {ex}")
+            return None
+        if str(changes.sync_token).startswith("fake-"):
+            # caldav emulated the report with a full listing, which doesn't
+            # tell us what was deleted
+            return None
+
+        dest_by_url = {dest_event["url"]: dest_event for dest_event in cached["events"]}
+        for e in changes.objects:
+            url = str(e.url)
+            dest_by_url.pop(url, None)
+            if e.data is None:
+                continue  # Deleted from the server
+            try:
+                dest_event = self.parse_dest_event(e)
+            except Exception as ex:
+                logging.error(f"Failed to parse or process destination event: {ex}")
+                continue
+            # The report covers the whole calendar; keep to the cached range
+            if dest_event["start_utc"] < cached["end"]:
+                dest_event["resource"] = e
+                dest_by_url[url] = dest_event
+        logging.info(
+            f"Synced {len(changes.objects)} changed events from '{self.dest_calendar}'."
+        )
+        return {**cached, "events": list(dest_by_url.values())}
+
+    def save_dest_state(self, ctag, sync_token, search_end_date, dest_events):
+        try:
+            with shelve.open(STATE_PATH) as state:
+                if ctag is None and sync_token is None:
+                    # Nothing to validate an index against next time
+                    state.pop("dest", None)
+                    return
+                state["dest"] = {
+                    "version": STATE_VERSION,
+                    "calendar": self.dest_calendar,
+                    "ctag": ctag,
+                    "sync_token": sync_token,
+                    "end": search_end_date,
+                    "events": [
+                        {k: v for k, v in ev.items() if k != "resource"}
+                        for ev in dest_events
+                    ],
+                }
+        except Exception as ex:
+            logging.warning(f"Could not save state to '{STATE_PATH}': {ex}")
 
     def run(self, client):
-        # Load all calendars
+        # Load all calendars, keeping only the destination and the calendars
+        # that filter sets read from
         calendars = client.principal().calendars()
-        cal_map = {c.name: c for c in calendars}
+        needed_cal_names = self.filters_by_cal.keys() | {self.dest_calendar}
+        cal_map = {c.name: c for c in calendars if c.name in needed_cal_names}
         dest_cal = cal_map.get(self.dest_calendar)
         if not dest_cal:
             raise Exception(f"Destination calendar '{self.dest_calendar}' not found.")
-        now = datetime.datetime.now(datetime.timezone.utc)
+        now = datetime.datetime.now(UTC)
+        # One DTSTAMP for every event saved in this run
+        self._dtstamp = format_ical_utc(now)
 
         # Determine the search range for source events
         # Search start date is based on past_keep_days to fetch all relevant past events
@@ -200,321 +738,303 @@ class EventTransformer:
             # Fallback for a reasonable future scan window
             search_end_date = now + datetime.timedelta(days=365)
 
-        # Get all destination calendar events
-        dest_events = dest_cal.events()
-        events_to_delete = []
-        dest_keys = set()
+        # Source calendars to scan, skipping any missing on the server
+        filters_by_cal = {}
+        for cal_name, cal_filters in self.filters_by_cal.items():
+            if cal_name not in cal_map:
+                print(f"Warning: Source calendar '{cal_name}' not found.")
+                continue
+            filters_by_cal[cal_name] = cal_filters
 
-        # Process all destination events once to:
-        # 1. Mark old events for deletion
-        # 2. Build set of existing UIDs
-        # 3. Handle deletions based on source events
+        # Reuse the last run's destination index: as is if the calendar is
+        # unchanged (same ctag), otherwise brought up to date through its
+        # sync token. Only the part of the window added since is fetched.
+        # The tags are read before fetching and saved with the new index, so
+        # changes made while this run is going (our own writes included) are
+        # picked up by the next run rather than taken as already seen.
+        ctag, sync_token = get_collection_tags(dest_cal)
+        cached = self.load_dest_state()
+        if cached is not None:
+            if ctag is not None and cached["ctag"] == ctag:
+                logging.info("Destination calendar unchanged, using cached index.")
+            else:
+                cached = self.sync_dest_state(dest_cal, cached)
+        # Only the end of the destination range is bounded: events before
+        # the source window still have to be seen to be pruned
+        dest_search = {"end": search_end_date}
+        if cached is not None:
+            if cached["end"] < search_end_date:
+                dest_search = {"start": cached["end"], "end": search_end_date}
+            else:
+                dest_search = None
+
+        # Fetch the destination and all source calendars concurrently, since
+        # each fetch is an independent, network-bound CalDAV request
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_WORKERS, len(filters_by_cal) + 1)
+        ) as executor:
+            if dest_search is not None:
+                # Destination events are never recurring masters we need to
+                # split, so skip server-side expansion and keep UIDs stable
+                dest_future = executor.submit(
+                    dest_cal.search, event=True, expand=False, **dest_search
+                )
+            else:
+                dest_future = executor.submit(list)
+            cached_sources = self.load_source_state()
+            source_futures = {
+                cal_name: executor.submit(
+                    self.fetch_source_events,
+                    cal_map[cal_name],
+                    cal_name,
+                    cached_sources.get(cal_name),
+                    search_start_date,
+                    search_end_date,
+                )
+                for cal_name in filters_by_cal
+            }
+            dest_events = dest_future.result()
+            source_state = {}
+            source_events_by_cal = {}
+            for cal_name, future in source_futures.items():
+                source_state[cal_name], source_events_by_cal[cal_name] = future.result()
+        self.save_source_state(source_state)
+
+        # Cutoff for pruning old destination events, fixed for the whole pass
+        history_limit = None
+        if self.past_keep_days is not None and self.past_keep_days > 0:
+            history_limit = now - datetime.timedelta(days=self.past_keep_days)
+
+        # Cached events first, then fetched ones; keyed by URL so an event
+        # both cached and fetched is only counted once
+        dest_by_url = {}
+        if cached is not None:
+            for dest_event in cached["events"]:
+                dest_by_url[dest_event["url"]] = dict(dest_event)
         for e in dest_events:
             try:
-                vevent = e.vobject_instance.vevent
-                summary = vevent.summary.value
-                dtstart = vevent.dtstart.value
-                dtend = getattr(vevent, "dtend", None) and vevent.dtend.value
-                original_uid = getattr(vevent, "x_original_uid", None)
-                current_uid = original_uid.value if original_uid else vevent.uid.value
-
-                # Add to existing UIDs set (for duplicate prevention)
-                dest_keys.add(current_uid)
-
-                should_delete = False
-
-                # Check for old events if past_keep_days is set
-                if self.past_keep_days is not None:
-                    if self.past_keep_days == 0:
-                        # Delete all past events
-                        if dtend:
-                            dtend_aware = (
-                                dtend.astimezone(datetime.timezone.utc)
-                                if isinstance(dtend, datetime.datetime)
-                                else datetime.datetime.combine(
-                                    dtend,
-                                    datetime.time.min,
-                                    tzinfo=datetime.timezone.utc,
-                                )
-                            )
-                            if dtend_aware < now:
-                                should_delete = True
-                                logging.info(f"Deleting past event: {summary}")
-                    elif self.past_keep_days > 0:
-                        # Delete events older than past_keep_days
-                        dtstart_aware = (
-                            dtstart.astimezone(datetime.timezone.utc)
-                            if isinstance(dtstart, datetime.datetime)
-                            else datetime.datetime.combine(
-                                dtstart, datetime.time.min, tzinfo=datetime.timezone.utc
-                            )
-                        )
-                        history_limit = now - datetime.timedelta(
-                            days=self.past_keep_days
-                        )
-                        if dtstart_aware < history_limit:
-                            should_delete = True
-                            logging.info(f"Deleting old event: {summary}")
-
-                if should_delete:
-                    events_to_delete.append(e)
-
+                dest_event = self.parse_dest_event(e)
             except Exception as ex:
                 logging.error(f"Failed to parse or process destination event: {ex}")
                 continue
+            dest_event["resource"] = e
+            dest_by_url[dest_event["url"]] = dest_event
 
-        # Delete marked events
-        if events_to_delete:
-            logging.info(
-                f"Deleting {len(events_to_delete)} old events from '{self.dest_calendar}'."
-            )
-        for e in events_to_delete:
-            e.delete()
-
-        # For each filter set, process only events from its source calendar
-        transformed = []
-        source_events_by_cal = {}
-        for filter_obj in self.filter_sets:
-            cal_name = filter_obj["filters"].get("calendar_name")
-            if not cal_name or cal_name == self.dest_calendar:
-                continue
-            if cal_name not in source_events_by_cal:
-                cal = cal_map.get(cal_name)
-                if not cal:
-                    print(f"Warning: Source calendar '{cal_name}' not found.")
-                    source_events_by_cal[cal_name] = []
-                    continue
+        # Stream each calendar's events through its filter sets, indexing the
+        # transformed results by key (UID + date) so each destination event
+        # is matched with a single dict lookup. The first filter set to
+        # produce a given key wins. This comes first so the destination
+        # events can be checked in a single pass below.
+        transformed_by_key = {}
+        for cal_name, cal_filter_sets in filters_by_cal.items():
+            for e in source_events_by_cal[cal_name]:
+                for compiled_filter in cal_filter_sets:
+                    if not self.match_event(e, compiled_filter):
+                        continue
+                    t = self.transform_event(e, compiled_filter.transformation)
+                    transformed_by_key.setdefault(self.event_key(t), t)
 
-                # Use the new search dates to query events
-                events = cal.search(
-                    start=search_start_date,
-                    end=search_end_date,
-                    event=True,
-                    expand=True,
-                )
+        events_to_delete = []
+        remaining_events_to_delete = []
+        dest_keys = set()
+        kept_dest_events = []
 
-                event_list = []
-                for e in events:
-                    vevent = None
-                    if hasattr(e, "vobject_instance") and e.vobject_instance:
-                        vevent = e.vobject_instance.vevent
-                    else:
-                        try:
-                            vcal = vobject.readOne(e.data)
-                            vevent = vcal.vevent
-                        except Exception as ex:
-                            print(f"Failed to parse event data: {ex}")
-                            continue
-
-                    # Extract event data
-                    dtstart = vevent.dtstart.value
-                    dtend = getattr(vevent, "dtend", None) and vevent.dtend.value
-                    duration = (
-                        getattr(vevent, "duration", None) and vevent.duration.value
-                    )
-                    if duration and not dtend:
-                        if isinstance(dtstart, datetime.datetime):
-                            dtend = dtstart + duration
-                        elif isinstance(dtstart, datetime.date):
-                            dtend = dtstart + duration
-
-                    # Create a dictionary for the event
-                    event = {
-                        "calendar": cal.name,
-                        "uid": getattr(vevent, "uid", None) and vevent.uid.value,
-                        "summary": vevent.summary.value,
-                        "dtstart": dtstart,
-                        "dtend": dtend,
-                        "location": getattr(vevent, "location", None)
-                        and vevent.location.value,
-                        "rsvp": (
-                            getattr(vevent, "partstat", None) and vevent.partstat.value
-                            if hasattr(vevent, "partstat")
-                            else ""
-                        ),
-                    }
+        # Process all destination events once to:
+        # 1. Build set of existing event keys (for duplicate prevention)
+        # 2. Mark old events for deletion
+        # 3. Mark events for deletion based on source events
+        for dest_event in dest_by_url.values():
+            summary = dest_event["summary"]
+            event_key = dest_event["key"]
+            # Add to existing keys set (for duplicate prevention)
+            dest_keys.add(event_key)
 
-                    # Handle naive datetimes and convert to UTC
-                    local_tz = datetime.datetime.now().astimezone().tzinfo
-                    if (
-                        isinstance(event["dtstart"], datetime.datetime)
-                        and event["dtstart"].tzinfo is None
-                    ):
-                        event["dtstart"] = event["dtstart"].replace(tzinfo=local_tz)
-                        if (
-                            event["dtend"]
-                            and isinstance(event["dtend"], datetime.datetime)
-                            and event["dtend"].tzinfo is None
-                        ):
-                            event["dtend"] = event["dtend"].replace(tzinfo=local_tz)
-
-                    if isinstance(event["dtstart"], datetime.datetime):
-                        event["dtstart"] = event["dtstart"].astimezone(
-                            datetime.timezone.utc
-                        )
-                        if event["dtend"] and isinstance(
-                            event["dtend"], datetime.datetime
-                        ):
-                            event["dtend"] = event["dtend"].astimezone(
-                                datetime.timezone.utc
-                            )
-
-                    event_list.append(event)
-                source_events_by_cal[cal_name] = event_list
-            # Only process events from this filter's calendar
-            filtered = [
-                e
-                for e in source_events_by_cal[cal_name]
-                if self.match_event(e, filter_obj)
-            ]
-            for e in filtered:
-                if self.should_delete_event(e):
+            # Check for old events if past_keep_days is set
+            if self.past_keep_days == 0:
+                # Delete all past events
+                if dest_event["end_utc"] and dest_event["end_utc"] < now:
+                    events_to_delete.append(dest_event)
+                    logging.info(f"Deleting past event: {summary}")
+                    continue
+            elif history_limit is not None:
+                # Delete events older than past_keep_days
+                if dest_event["start_utc"] < history_limit:
+                    events_to_delete.append(dest_event)
+                    logging.info(f"Deleting old event: {summary}")
                     continue
-                e_copy = e.copy()
-                e_copy["original_uid"] = e.get("uid")
-                transformed.append(
-                    self.transform_event(e_copy, filter_obj.get("transformations", {}))
-                )
-
-        # Get all transformed source events' keys (UID + date) for comparison
-        source_event_keys = {self.event_key(e) for e in transformed}
-
-        # Process remaining destination events for deletion based on source events
-        remaining_events_to_delete = []
-        for e in dest_events:
-            if e in events_to_delete:  # Skip if already marked for deletion
-                continue
-
-            vevent = e.vobject_instance.vevent
-            summary = vevent.summary.value
-            dtstart = vevent.dtstart.value
-            
-            # Create a destination event dict for key comparison
-            dest_event = {
-                "uid": vevent.uid.value,
-                "original_uid": getattr(vevent, "x_original_uid", None) and vevent.x_original_uid.value,
-                "dtstart": dtstart
-            }
-            event_key = self.event_key(dest_event)
 
             # Delete if any of these conditions are met:
             # - Event was previously imported (has original_uid) but source no longer has it
             # - Event is marked with ❌
             # - Matching source event exists and should be deleted (e.g., DECLINED)
-            if dest_event["original_uid"] and event_key not in source_event_keys:
-                remaining_events_to_delete.append(e)
+            if dest_event["original_uid"] and event_key not in transformed_by_key:
+                remaining_events_to_delete.append(dest_event)
                 logging.info(f"Deleting event no longer in source: {summary}")
-            elif summary.startswith("❌"):
-                remaining_events_to_delete.append(e)
+                continue
+            if dest_event["declined"]:
+                remaining_events_to_delete.append(dest_event)
                 logging.info(f"Deleting declined event: {summary}")
-            else:
-                # Check if there's a matching source event that should be deleted
-                # Create event key for comparison using the same structure
-                dest_event_for_key = {
-                    "uid": current_uid,
-                    "dtstart": dtstart
-                }
-                dest_key = self.event_key(dest_event_for_key)
-                src_event = next(
-                    (ev for ev in transformed if self.event_key(ev) == dest_key),
-                    None
-                )
-                if src_event and self.should_delete_event(src_event):
-                    remaining_events_to_delete.append(e)
-                    logging.info(f"Deleting declined event: {summary}")
+                continue
+            # Check if there's a matching source event that should be deleted
+            src_event = transformed_by_key.get(event_key)
+            if src_event and self.should_delete_event(src_event):
+                remaining_events_to_delete.append(dest_event)
+                logging.info(f"Deleting declined event: {summary}")
+                continue
 
-        # Delete remaining marked events
+            kept_dest_events.append(dest_event)
+
+        # Delete marked events
+        if events_to_delete:
+            logging.info(
+                f"Deleting {len(events_to_delete)} old events from '{self.dest_calendar}'."
+            )
         if remaining_events_to_delete:
             logging.info(
                 f"Deleting {len(remaining_events_to_delete)} additional events from '{self.dest_calendar}'."
             )
-        for e in remaining_events_to_delete:
-            e.delete()
-
-        # Build a set of existing event keys (UID + date) to prevent duplicates
-        dest_events_dict = {
-            self.event_key({
-                "uid": e.vobject_instance.vevent.uid.value,
-                "original_uid": getattr(e.vobject_instance.vevent, "x_original_uid", None) and e.vobject_instance.vevent.x_original_uid.value,
-                "dtstart": e.vobject_instance.vevent.dtstart.value
-            }) for e in dest_events
-        }
+        run_concurrently(
+            lambda ev: self.dest_resource(dest_cal, ev).delete(),
+            events_to_delete + remaining_events_to_delete,
+        )
 
         # Print count of events we're about to add
-        logging.info(f"Found {len(transformed)} eligible events.")
-        # Save transformed events
-        for e in transformed:
-            key = self.event_key(e)
-            if key in dest_events_dict:
-                continue  # Skip duplicate
+        logging.info(f"Found {len(transformed_by_key)} eligible events.")
+        # Save transformed events concurrently; each save is an independent PUT
+        to_add = []
+        for key, e in transformed_by_key.items():
+            if key in dest_keys:
+                continue  # Skip duplicate, no PUT needed
+            uid = self.event_uid(e)
             logging.info(
                 f"Adding event: {e['summary']} on {e['dtstart']} to {self.dest_calendar}"
             )
-            ical = self.event_to_ical(e)
-            dest_cal.save_event(ical, no_overwrite=True)
+            to_add.append((key, e, uid, self.event_to_ical(e, uid)))
+        saved = run_concurrently(
+            lambda item: self.save_new_event(dest_cal, item[3]), to_add
+        )
+        if None in saved:
+            # The destination has events the index doesn't know about, so
+            # drop it and fetch the calendar in full next time
+            ctag = sync_token = None
+
+        # Remember the resulting destination calendar for the next run
+        final_dest_events = kept_dest_events
+        for (key, e, uid, _), resource in zip(to_add, saved):
+            if resource is None:
+                continue
+            dtstart, dtend = self.event_bounds(e)
+            final_dest_events.append(
+                self.index_dest_event(
+                    {
+                        "url": str(resource.url),
+                        "uid": uid,
+                        "original_uid": e.get("original_uid"),
+                        "summary": e.get("summary", ""),
+                        "dtstart": dtstart,
+                        "dtend": dtend,
+                    }
+                )
+            )
+        self.save_dest_state(ctag, sync_token, search_end_date, final_dest_events)
+
+    def save_new_event(self, dest_cal, ical):
+        # An event with the same UID already on the server (one the index
+        # missed) is skipped rather than failing the whole batch
+        try:
+            return dest_cal.save_event(ical, no_overwrite=True)
+        except ConsistencyError as ex:
+            logging.warning(f"Not adding event to {self.dest_calendar}: {ex}")
+            return None
+
+    def dest_resource(self, dest_cal, dest_event):
+        # Fetched events carry their caldav object; cached ones only a URL
+        resource = dest_event.get("resource")
+        if resource is None:
+            resource = caldav.Event(
+                client=dest_cal.client, url=dest_event["url"], parent=dest_cal
+            )
+        return resource
 
-    def event_to_ical(self, event):
+    def event_bounds(self, event):
+        # Start and end as written to the destination calendar
         dtstart = event["dtstart"]
         dtend = event.get("dtend")
 
-        ical_parts = [
-            "BEGIN:VCALENDAR\nVERSION:2.0\n",
-            "BEGIN:VEVENT\n",
-            f"UID:{str(uuid.uuid4())}\n",
-            f"DTSTAMP:{datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S')}Z\n",
-            f"SUMMARY:{event.get('summary', '')}\n",
-        ]
-
         # All-day event detection
         is_all_day = isinstance(dtstart, datetime.date) and not isinstance(
             dtstart, datetime.datetime
         )
 
         if is_all_day:
-            dtstart_date = (
-                dtstart.date() if isinstance(dtstart, datetime.datetime) else dtstart
-            )
             if dtend:
-                dtend_date = (
-                    dtend.date() if isinstance(dtend, datetime.datetime) else dtend
-                )
+                dtend = dtend.date() if isinstance(dtend, datetime.datetime) else dtend
+            else:
+                dtend = dtstart + datetime.timedelta(days=1)
+        elif dtend is None:
+            # Try to use duration if present
+            duration = event.get("duration")
+            if duration:
+                dtend = dtstart + duration
             else:
-                dtend_date = dtstart_date + datetime.timedelta(days=1)
-            ical_parts.append(f"DTSTART;VALUE=DATE:{dtstart_date.strftime('%Y%m%d')}\n")
-            ical_parts.append(f"DTEND;VALUE=DATE:{dtend_date.strftime('%Y%m%d')}\n")
+                dtend = dtstart + datetime.timedelta(hours=1)
+        return dtstart, dtend
+
+    def event_uid(self, event):
+        # Derived from everything written to the destination except DTSTAMP
+        dtstart, dtend = self.event_bounds(event)
+        return content_uid(
+            event.get("original_uid"),
+            event.get("summary"),
+            dtstart,
+            dtend,
+            event.get("location"),
+            event.get("rsvp"),
+        )
+
+    def event_to_ical(self, event, uid=None):
+        dtstart, dtend = self.event_bounds(event)
+
+        if not isinstance(dtstart, datetime.datetime):
+            value_type = ";VALUE=DATE"
+            dtstart_str = format_ical_date(dtstart)
+            dtend_str = format_ical_date(dtend)
         else:
             # Timed events (UTC)
-            if dtend is None:
-                # Try to use duration if present
-                duration = event.get("duration")
-                if duration:
-                    dtend = dtstart + duration
-                else:
-                    dtend = dtstart + datetime.timedelta(hours=1)
-            # Use the UTC times for iCalendar output
-            dtstart_str = dtstart.strftime("%Y%m%dT%H%M%S") + "Z"
-            dtend_str = dtend.strftime("%Y%m%dT%H%M%S") + "Z"
-            ical_parts.append(f"DTSTART:{dtstart_str}\n")
-            ical_parts.append(f"DTEND:{dtend_str}\n")
+            value_type = ""
+            dtstart_str = format_ical_utc(dtstart)
+            dtend_str = format_ical_utc(dtend)
 
+        optional_lines = []
         if event.get("location"):
             sanitized_location = self.sanitize_text(event["location"])
-            ical_parts.append(f"LOCATION:{sanitized_location}\n")
+            optional_lines.append(f"LOCATION:{sanitized_location}\n")
         if event.get("original_uid"):
-            ical_parts.append(f"X-ORIGINAL-UID:{event['original_uid']}\n")
+            optional_lines.append(f"X-ORIGINAL-UID:{event['original_uid']}\n")
         if event.get("rsvp"):
-            ical_parts.append(f"RSVP:{event['rsvp']}\n")
+            optional_lines.append(f"RSVP:{event['rsvp']}\n")
 
-        ical_parts.append("END:VEVENT\nEND:VCALENDAR")
-        return "".join(ical_parts)
+        return ICAL_TEMPLATE.format_map(
+            {
+                "uid": uid or self.event_uid(event),
+                "dtstamp": self._dtstamp
+                or format_ical_utc(datetime.datetime.now(UTC)),
+                "summary": self.sanitize_text(event.get("summary", "")),
+                "value_type": value_type,
+                "dtstart": dtstart_str,
+                "dtend": dtend_str,
+                "optional_lines": "".join(optional_lines),
+            }
+        )
 
 
 def main():
-    config = toml.load(CONFIG_PATH)
+    config = load_config(CONFIG_PATH)
     username = config["fastmail"]["username"]
     password = config["fastmail"]["password"]
     url = config["fastmail"]["url"]
     client = caldav.DAVClient(url=url, username=username, password=password)
+    configure_session(client)
     transformer = EventTransformer(config)
     transformer.run(client)
 
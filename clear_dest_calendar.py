@@ -1,19 +1,31 @@
-import toml
 import caldav
 import logging
 
-CONFIG_PATH = "config.toml"
+from calendar_transformer import (
+    CONFIG_PATH,
+    configure_session,
+    load_config,
+    run_concurrently,
+)
 
 logging.basicConfig(level=logging.INFO)
 
+def delete_event(e):
+    try:
+        e.delete()
+        logging.info(f"Deleted event UID: {getattr(e.vobject_instance.vevent, 'uid', None) and e.vobject_instance.vevent.uid.value}")
+    except Exception as ex:
+        logging.error(f"Failed to delete event: {ex}")
+
 def main():
-    config = toml.load(CONFIG_PATH)
+    config = load_config(CONFIG_PATH)
     username = config["fastmail"]["username"]
     password = config["fastmail"]["password"]
     url = config["fastmail"]["url"]
     dest_calendar_name = config["dest_calendar"]
 
     client = caldav.DAVClient(url=url, username=username, password=password)
+    configure_session(client)
     calendars = client.principal().calendars()
     cal_map = {c.name: c for c in calendars}
     dest_cal = cal_map.get(dest_calendar_name)
@@ -22,12 +34,8 @@ def main():
 
     events = dest_cal.events()
     logging.info(f"Found {len(events)} events in destination calendar '{dest_calendar_name}'. Deleting...")
-    for e in events:
-        try:
-            e.delete()
-            logging.info(f"Deleted event UID: {getattr(e.vobject_instance.vevent, 'uid', None) and e.vobject_instance.vevent.uid.value}")
-        except Exception as ex:
-            logging.error(f"Failed to delete event: {ex}")
+    # Each DELETE is an independent request, so send them concurrently
+    run_concurrently(delete_event, events)
     logging.info("All events deleted from destination calendar.")
 
 if __name__ == "__main__":
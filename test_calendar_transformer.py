@@ -0,0 +1,215 @@
+import datetime
+
+import vobject
+
+from calendar_transformer import UTC, in_window, iter_occurrences
+
+# Fixed offset, so floating times resolve the same on every machine
+LOCAL_TZ = datetime.timezone(datetime.timedelta(hours=2))
+WINDOW_START = datetime.datetime(2026, 10, 1, tzinfo=UTC)
+WINDOW_END = datetime.datetime(2026, 11, 1, tzinfo=UTC)
+
+
+def calendar(*vevents):
+    # VCALENDAR from VEVENT bodies; indentation is stripped, so it isn't read
+    # as folded lines
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0"]
+    for body in vevents:
+        lines.append("BEGIN:VEVENT")
+        lines.extend(line.strip() for line in body.strip().splitlines())
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return vobject.readOne("\n".join(lines) + "\n")
+
+
+def occurrences(vcal, window_start=WINDOW_START, window_end=WINDOW_END):
+    return [
+        (dtstart, dtend)
+        for _, dtstart, dtend in iter_occurrences(
+            vcal, window_start, window_end, LOCAL_TZ
+        )
+    ]
+
+
+def utc(*args):
+    return datetime.datetime(*args, tzinfo=UTC)
+
+
+def test_until_utc():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000Z
+        DTEND:20261005T100000Z
+        RRULE:FREQ=DAILY;UNTIL=20261008T090000Z
+        """
+    )
+    assert [start for start, _ in occurrences(vcal)] == [
+        utc(2026, 10, day, 9) for day in (5, 6, 7, 8)
+    ]
+    assert occurrences(vcal)[-1][1] == utc(2026, 10, 8, 10)
+
+
+def test_until_floating():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000
+        DTEND:20261005T100000
+        RRULE:FREQ=DAILY;UNTIL=20261007T090000
+        """
+    )
+    # Floating occurrences stay naive; they are localized later, by to_utc
+    assert occurrences(vcal) == [
+        (
+            datetime.datetime(2026, 10, day, 9),
+            datetime.datetime(2026, 10, day, 10),
+        )
+        for day in (5, 6, 7)
+    ]
+
+
+def test_until_date():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART;VALUE=DATE:20261005
+        DTEND;VALUE=DATE:20261006
+        RRULE:FREQ=DAILY;UNTIL=20261007
+        """
+    )
+    assert occurrences(vcal) == [
+        (datetime.date(2026, 10, day), datetime.date(2026, 10, day + 1))
+        for day in (5, 6, 7)
+    ]
+
+
+def test_floating_window_edge():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000
+        DTEND:20261005T100000
+        RRULE:FREQ=DAILY;COUNT=5
+        """
+    )
+    # 08:00 UTC is 10:00 local: the occurrence on the 6th ends exactly then
+    window_start = utc(2026, 10, 6, 8)
+    window_end = utc(2026, 10, 8, 7)  # 09:00 local, when the 8th starts
+    assert [start for start, _ in occurrences(vcal, window_start, window_end)] == [
+        datetime.datetime(2026, 10, 7, 9)
+    ]
+
+
+def test_exdate():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000Z
+        DTEND:20261005T100000Z
+        RRULE:FREQ=WEEKLY;COUNT=3
+        EXDATE:20261012T090000Z
+        """
+    )
+    assert [start for start, _ in occurrences(vcal)] == [
+        utc(2026, 10, 5, 9),
+        utc(2026, 10, 19, 9),
+    ]
+
+
+def test_recurrence_id_override():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000Z
+        DTEND:20261005T100000Z
+        RRULE:FREQ=DAILY;COUNT=3
+        SUMMARY:master
+        """,
+        """
+        UID:a
+        RECURRENCE-ID:20261006T090000Z
+        DTSTART:20261006T150000Z
+        DTEND:20261006T160000Z
+        SUMMARY:moved
+        """,
+    )
+    got = [
+        (vevent.summary.value, dtstart)
+        for vevent, dtstart, _ in iter_occurrences(
+            vcal, WINDOW_START, WINDOW_END, LOCAL_TZ
+        )
+    ]
+    assert sorted(got, key=lambda item: item[1]) == [
+        ("master", utc(2026, 10, 5, 9)),
+        ("moved", utc(2026, 10, 6, 15)),
+        ("master", utc(2026, 10, 7, 9)),
+    ]
+
+
+def test_recurrence_id_override_moved_out_of_window():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART:20261005T090000Z
+        DTEND:20261005T100000Z
+        RRULE:FREQ=DAILY;COUNT=2
+        """,
+        """
+        UID:a
+        RECURRENCE-ID:20261006T090000Z
+        DTSTART:20261206T090000Z
+        DTEND:20261206T100000Z
+        """,
+    )
+    assert [start for start, _ in occurrences(vcal)] == [utc(2026, 10, 5, 9)]
+
+
+def test_all_day_without_dtend_lasts_a_day():
+    vcal = calendar(
+        """
+        UID:a
+        DTSTART;VALUE=DATE:20261001
+        RRULE:FREQ=DAILY;COUNT=10
+        """
+    )
+    # The occurrence on the 5th is still under way at noon. All-day dates
+    # are matched in local time, so end the window before local midnight.
+    window_start = utc(2026, 10, 5, 12)
+    window_end = utc(2026, 10, 6, 20)
+    assert occurrences(vcal, window_start, window_end) == [
+        (datetime.date(2026, 10, 5), None),
+        (datetime.date(2026, 10, 6), None),
+    ]
+
+
+def event(dtstart, dtend=None):
+    return {"dtstart": dtstart, "dtend": dtend}
+
+
+def test_in_window_edges():
+    hour = datetime.timedelta(hours=1)
+    start, end = WINDOW_START, WINDOW_END
+    # Timed events overlap [start, end) only if they end after it starts
+    assert not in_window(event(start - hour, start), start, end)
+    assert in_window(event(start - hour, start + hour), start, end)
+    assert in_window(event(end - hour, end), start, end)
+    assert not in_window(event(end, end + hour), start, end)
+    # Instants count at the window start but not at its end
+    assert in_window(event(start), start, end)
+    assert not in_window(event(end), start, end)
+
+
+def test_in_window_all_day():
+    start, end = utc(2026, 10, 5, 12), utc(2026, 10, 7)
+    # Without DTEND an all-day event covers its whole day
+    assert in_window(event(datetime.date(2026, 10, 5)), start, end)
+    assert not in_window(event(datetime.date(2026, 10, 4)), start, end)
+    assert in_window(event(datetime.date(2026, 10, 6)), start, end)
+    assert not in_window(event(datetime.date(2026, 10, 7)), start, end)
+    # DTEND is exclusive
+    assert not in_window(
+        event(datetime.date(2026, 10, 4), datetime.date(2026, 10, 5)),
+        utc(2026, 10, 5),
+        end,
+    )